@@ -18,6 +18,9 @@ __author__ = 'Thom Hurks'
 # 0 40
 # 0 68
 # So on each line <number representing from node><tab character><number representing to node>
+# The text file may be gzip, bz2, xz or zstd compressed. Alternatively the graph can be a binary file of consecutive
+# (from node, to node) pairs of little endian unsigned 32 or 64 bit integers, optionally compressed in the same way.
+# The compression and format are detected automatically, use --format to override the format.
 
 # The test graphs we use are Kronecker graphs generated using the Stanford Network Analysis Platform (SNAP)
 # URL: https://github.com/snap-stanford/snap/tree/master/examples/krongen
@@ -29,11 +32,35 @@ from timeit import default_timer as timer
 from array import array
 from bitarray import bitarray
 import multiprocessing
+import threading
+import queue
 import argparse
-from queue import Full
 from fractions import Fraction
 from paramiko import *
 import pickle
+# The zstandard module is only needed for reading zstd compressed input graphs.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# The resource module (Unix only) is used to report the peak memory usage.
+try:
+    import resource
+except ImportError:
+    resource = None
+import struct
+import gzip
+import bz2
+import lzma
+import io
+import mmap
+import tempfile
+import shutil
+import hashlib
+import random
+import codecs
+import unicodedata
+from collections import deque
 
 def ParseArgs():
     parser = argparse.ArgumentParser(description='Run the SSC12 algorithm on an input graph')
@@ -44,22 +71,54 @@ def ParseArgs():
     subparsers = parser.add_subparsers(help='List of available commands.', dest='command')
     parser_compute = subparsers.add_parser('compute', help='Read in a plaintext graph or a preprocessed graph, compute the SSC and save the result to disk.')
     parser_preprocess = subparsers.add_parser('preprocess', help='Only invoke the graph preprocessing algorithm and save the result to disk.')
+    parser_calibrate = subparsers.add_parser('calibrate', help='Tune alpha and beta for a preprocessed graph by timing a sample of source vertices under SSC1 and SSC2.')
+    parser_benchmark = subparsers.add_parser('benchmark', help='Time SSC1 against SSC1Fused on a preprocessed graph and check that they give the same results.')
+    parser_lookup = subparsers.add_parser('lookup', help='Print the closure of a single source vertex from a pairs file written by compute --pairs.')
 
-    parser_preprocess.add_argument('inputfile', action='store', type=ExistingFile, help='The text file that the graph will be read from.', metavar='inputfile')
+    parser_preprocess.add_argument('inputfile', action='store', type=ExistingFile, help='The text or binary file that the graph will be read from.', metavar='inputfile')
     parser_preprocess.add_argument('graphfile_output', action='store', type=str, help='The file that the preprocessed graph will be written to.', metavar='graphfile')
     parser_preprocess.add_argument('sourcevertices_output', action='store', type=str, help='The file that the discovered source vertices will be written to.', metavar='sourcevertices')
+    parser_preprocess.add_argument('--format', action='store', required=False, choices=inputFormats, default='auto', help='The format of the input graph: tab separated text or binary pairs of little endian 32/64 bit integers. Compression is always detected automatically.', metavar='format')
+    parser_preprocess.add_argument('--order', action='store', required=False, choices=vertexOrders, default='original', help='Remap the vertex IDs to a dense range, numbered in the given order. "original" keeps the relative order of the input IDs.', metavar='order')
     parser_preprocess.add_argument('--nrofvertexfiles', action='store', required=False, type=int, default=None, help='The source vertices are divided over <nrofvertexfiles> files, using the format <sourcevertices>_nr.extension', metavar='nrofvertexfiles')
 
+    parser_calibrate.add_argument('graphfile', action='store', type=ExistingFile, help='The preprocessed graph file; the tuned alpha and beta are saved into it.', metavar='graphfile')
+    parser_calibrate.add_argument('sourcevertices', action='store', type=ExistingFile, help='The binary file that the source vertices will be sampled from.', metavar='sourcevertices')
+    parser_calibrate.add_argument('--samples', action='store', required=False, type=int, default=100, help='The number of source vertices to time under both SSC1 and SSC2.', metavar='samples')
+    parser_calibrate.add_argument('--seed', action='store', required=False, type=int, default=None, help='Seed for sampling the source vertices.', metavar='seed')
+
+    parser_benchmark.add_argument('graphfile', action='store', type=ExistingFile, help='The binary file that the preprocessed graph will be read from.', metavar='graphfile')
+    parser_benchmark.add_argument('sourcevertices', action='store', type=ExistingFile, help='The binary file that the source vertices will be read from.', metavar='sourcevertices')
+    parser_benchmark.add_argument('--samples', action='store', required=False, type=int, default=None, help='Only time this many randomly chosen source vertices instead of all of them.', metavar='samples')
+    parser_benchmark.add_argument('--seed', action='store', required=False, type=int, default=None, help='Seed for sampling the source vertices.', metavar='seed')
+
+    parser_lookup.add_argument('pairsfile', action='store', type=ExistingFile, help='The binary pairs file that the closure will be read from.', metavar='pairsfile')
+    parser_lookup.add_argument('sourcevertex', action='store', type=int, help='The source vertex whose closure will be printed.', metavar='sourcevertex')
+
     parser_compute.add_argument('outputfile', action='store', type=str, help='The file that the SSC output will be written to.', metavar='outputfile')
-    parser_compute.add_argument('--alpha', action='store', required=False, type=Fraction, default=1/8, help='Determines the cutoff point between SSC1 and SSC2.', metavar='alpha')
-    parser_compute.add_argument('--beta', action='store', required=False, type=Fraction, default=1/128, help='Determines the cutoff point between SSC1 and SSC2.', metavar='beta')
+    parser_compute.add_argument('--algorithm', action='store', required=False, choices=computeAlgorithms, default='SSC12', help='SSC12 computes the closure per source vertex, SemiNaive and Smart compute the full transitive closure relation for comparison.', metavar='algorithm')
+    parser_compute.add_argument('--alpha', action='store', required=False, type=Fraction, default=None, help='Determines the cutoff point between SSC1 and SSC2. Defaults to the calibrated value of a preprocessed graph, or 1/8.', metavar='alpha')
+    parser_compute.add_argument('--beta', action='store', required=False, type=Fraction, default=None, help='Determines the cutoff point between SSC1 and SSC2. Defaults to the calibrated value of a preprocessed graph, or 1/128.', metavar='beta')
+    parser_compute.add_argument('--pairs', action='store', required=False, type=str, default=None, help='Also write the full (source, reached) closure relation to <pairsfile> in a compressed binary encoding.', metavar='pairsfile')
+    parser_compute.add_argument('--executor', action='store', required=False, choices=sorted(executors), default='process', help='Run the workers as processes, as threads (for free-threaded Python) or serially in the main process.', metavar='executor')
+    parser_compute.add_argument('--memory-budget', action='store', required=False, type=MemorySize, default=None, help='Bound the memory used for jobs and results in flight (excluding the graph itself), e.g. 512M or 4G. Workers block when the collector falls behind, and results too large for the budget are spilled to disk.', metavar='bytes', dest='memory_budget')
+    parser_compute.add_argument('--spill-directory', action='store', required=False, type=ExistingDirectory, default=None, help='The directory that results are spilled to when they do not fit in the memory budget. Defaults to the system temporary directory.', metavar='directory', dest='spill_directory')
+    parser_compute.add_argument('--checkpoint', action='store', required=False, type=str, default=None, help='Periodically save the completed source vertices and the closure so far to <checkpointfile>.', metavar='checkpointfile')
+    parser_compute.add_argument('--checkpoint-interval', action='store', required=False, type=float, default=300, help='The number of seconds between two checkpoints.', metavar='seconds', dest='checkpoint_interval')
+    parser_compute.add_argument('--resume', action='store_true', required=False, help='Continue from the checkpoint file, skipping the source vertices that were already completed. Requires --checkpoint.')
     parser_compute.add_argument('--pemfile', action='store', required=False, type=ExistingFile, help='The location of the PEM file to use for remote authentication.', metavar='pemfile')
 
     subparsers_compute = parser_compute.add_subparsers(help='List of available subcommands for computing the SSC.', dest='compute_subcommand')
     subparser_compute_fresh = subparsers_compute.add_parser('fresh', help='Read the input graph, preprocess it, compute the SSC and save the result.')
     subparser_compute_cache = subparsers_compute.add_parser('preprocessed', help='Read in a preprocessed graph, compute the SSC and save the result.')
 
-    subparser_compute_fresh.add_argument('inputfile', action='store', type=ExistingFile, help='The text file that the graph will be read from.', metavar='inputfile')
+    subparser_compute_fresh.add_argument('inputfile', action='store', type=ExistingFile, help='The text or binary file that the graph will be read from.', metavar='inputfile')
+    subparser_compute_fresh.add_argument('--format', action='store', required=False, choices=inputFormats, default='auto', help='The format of the input graph: tab separated text or binary pairs of little endian 32/64 bit integers. Compression is always detected automatically.', metavar='format')
+    subparser_compute_fresh.add_argument('--order', action='store', required=False, choices=vertexOrders, default='original', help='Remap the vertex IDs to a dense range, numbered in the given order. "original" keeps the relative order of the input IDs.', metavar='order')
+
+    subparser_compute_fresh.add_argument('--cache-directory', action='store', required=False, type=str, default=defaultCacheDirectory, help='The directory that preprocessed graphs are cached in, keyed by the contents of the input file.', metavar='directory', dest='cache_directory')
+    subparser_compute_fresh.add_argument('--cache-size', action='store', required=False, type=MemorySize, default=1 << 30, help='The maximum size of the cache directory, e.g. 512M or 4G. The least recently used graphs are evicted first.', metavar='bytes', dest='cache_size')
+    subparser_compute_fresh.add_argument('--no-cache', action='store_true', required=False, help='Always parse the input file, without reading or writing the cache.', dest='no_cache')
 
     subparser_compute_cache.add_argument('graphfile_input', action='store', type=ExistingFile, help='The binary file that the preprocessed graph will be read from.', metavar='graphfile')
     subparser_compute_cache.add_argument('sourcevertices_input', action='store', type=ExistingFile, help='The binary file that the source vertices will be read from.', metavar='sourcevertices')
@@ -74,6 +133,21 @@ def ExistingFile(filename):
         raise argparse.ArgumentTypeError("%s is not a valid input file!" % filename)
 
 
+def ExistingDirectory(directory):
+    if os.path.isdir(directory):
+        return directory
+    else:
+        raise argparse.ArgumentTypeError("%s is not a valid directory!" % directory)
+
+
+def MemorySize(value):
+    units = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    sizeResult = re.match(r"^(?P<size>\d+(\.\d+)?)(?P<unit>[KMGT]?)B?$", value.strip().upper())
+    if sizeResult is None:
+        raise argparse.ArgumentTypeError("%s is not a valid memory size!" % value)
+    return int(float(sizeResult.group("size")) * units[sizeResult.group("unit")])
+
+
 def GetValidOutputFilename(outputFilename, overwrite_file, unique):
     outputFile = None
     outputFilenameFinal = ""
@@ -122,30 +196,157 @@ def CreateUniqueOutputfile(outputFilename, extension):
     return outputFile, outputFilenameFinal
 
 
-def ParseInputfile(inputFilename):
-    startTime = timer()
+inputFormats = ['auto', 'text', 'int32', 'int64']
+# Magic numbers at the start of the compressed files, mapped to a function that opens the file as a binary stream.
+compressionMagics = [(b'\x1f\x8b', 'gzip', gzip.open),
+                     (b'BZh', 'bz2', bz2.open),
+                     (b'\xfd7zXZ\x00', 'xz', lzma.open),
+                     (b'\x28\xb5\x2f\xfd', 'zstd', lambda filename: OpenZstdFile(filename))]
+
+
+def OpenZstdFile(filename):
+    if zstandard is None:
+        print("Input graph is zstd compressed, install the zstandard module to read it!")
+        exit(1)
+    return zstandard.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True)
+
+
+def OpenInputfile(inputFilename):
+    # Returns the name of the compression and the file opened as a (decompressed) binary stream.
+    with open(inputFilename, 'rb') as inputFile:
+        header = inputFile.read(8)
+    for (magic, compression, openFunction) in compressionMagics:
+        if header.startswith(magic):
+            return compression, openFunction(inputFilename)
+    return None, open(inputFilename, 'rb')
+
+
+def DetectInputFormat(header, totalSize=None):
+    # Text graphs are UTF-8 (possibly with a byte order mark) and only contain digits, whitespace and (comment) text,
+    # while binary graphs with small IDs are full of zero bytes. For binary graphs with IDs below 2^32, the upper half
+    # of every 64 bit integer is zero, which tells the two integer sizes apart.
+    if header.startswith(codecs.BOM_UTF8) or IsPlainText(header):
+        return 'text'
+    if totalSize is not None and totalSize % 8 != 0:
+        # Binary graphs always consist of whole edges of 8 or 16 bytes.
+        return 'text'
+    int64Length = len(header) - len(header) % 8
+    if (totalSize is None or totalSize % 16 == 0) and int64Length >= 16 and \
+            not any(header[index + 4:index + 8] != b'\x00\x00\x00\x00' for index in range(0, int64Length, 8)):
+        return 'int64'
+    return 'int32'
+
+
+def IsPlainText(header):
+    try:
+        text = header.decode('utf-8')
+    except UnicodeDecodeError as error:
+        # The header may cut a multibyte character in half.
+        if error.reason != 'unexpected end of data':
+            return False
+        text = header[:error.start].decode('utf-8')
+    return all(character in '\t\n\r' or not unicodedata.category(character).startswith('C') for character in text)
+
+
+def ReadEdges(inputFilename, inputFormat='auto'):
+    # Yields every (from node, to node) edge of the input graph, regardless of its format and compression.
+    (compression, graphFile) = OpenInputfile(inputFilename)
+    with graphFile:
+        if compression is None:
+            header = graphFile.read(4096)
+            graphFile.seek(0)
+            totalSize = os.path.getsize(inputFilename)
+        else:
+            graphFile = io.BufferedReader(graphFile)
+            header = graphFile.peek(4096)[:4096]
+            totalSize = None
+        if inputFormat == 'auto':
+            inputFormat = DetectInputFormat(header, totalSize)
+        print("Reading the input graph as %s%s." %
+              (inputFormat, "" if compression is None else " (%s compressed)" % compression))
+        if inputFormat == 'text':
+            yield from ReadTextEdges(io.TextIOWrapper(graphFile, encoding='utf-8-sig', errors='replace'))
+        elif compression is None:
+            yield from ReadMappedBinaryEdges(graphFile, 'I' if inputFormat == 'int32' else 'Q')
+        else:
+            yield from ReadStreamedBinaryEdges(graphFile, 'I' if inputFormat == 'int32' else 'Q')
+
+
+def ReadTextEdges(graphFile):
     line_re = re.compile("^(?P<nr1>\d+)\t(?P<nr2>\d+)$")
+    for line in graphFile:
+        lineResult = line_re.match(line)
+        if lineResult is not None:
+            try:
+                nr1 = int(lineResult.group("nr1"))
+                nr2 = int(lineResult.group("nr2"))
+            except ValueError:
+                print("Input graph cannot be parsed!")
+                exit(1)
+            yield nr1, nr2
+
+
+def ReadMappedBinaryEdges(graphFile, typecode):
+    # Uncompressed binary graphs are memory mapped and read in place, without parsing or copying.
+    itemSize = array(typecode).itemsize
+    if os.fstat(graphFile.fileno()).st_size % (2 * itemSize) != 0:
+        print("Input graph size is not a multiple of the edge size!")
+        exit(1)
+    if os.fstat(graphFile.fileno()).st_size == 0:
+        return
+    with mmap.mmap(graphFile.fileno(), 0, access=mmap.ACCESS_READ) as graphMap:
+        if sys.byteorder == 'little':
+            edges = memoryview(graphMap).cast(typecode)
+        else:
+            edges = array(typecode)
+            edges.frombytes(graphMap)
+            edges.byteswap()
+        fromNodes = edges[0::2]
+        toNodes = edges[1::2]
+        try:
+            yield from zip(fromNodes, toNodes)
+        finally:
+            # The memory map can only be closed once no views on it are left.
+            if isinstance(edges, memoryview):
+                fromNodes.release()
+                toNodes.release()
+                edges.release()
+
+
+def ReadStreamedBinaryEdges(graphFile, typecode, chunkSize=1 << 20):
+    edgeSize = 2 * array(typecode).itemsize
+    remainder = b''
+    while True:
+        chunk = graphFile.read(chunkSize * edgeSize)
+        if not chunk:
+            break
+        chunk = remainder + chunk
+        usableLength = len(chunk) - len(chunk) % edgeSize
+        remainder = chunk[usableLength:]
+        edges = array(typecode)
+        edges.frombytes(chunk[:usableLength])
+        if sys.byteorder != 'little':
+            edges.byteswap()
+        yield from zip(edges[0::2], edges[1::2])
+    if remainder:
+        print("Input graph size is not a multiple of the edge size!")
+        exit(1)
+
+
+def ParseInputfile(inputFilename, inputFormat='auto'):
+    startTime = timer()
     maxVertexNumber = -1
     adjacentLookup = dict()
     sourceVertices = set()
     targetVertices = set()
-    with open(inputFilename) as graphFile:
-        # Start reading in the input file
-        for line in graphFile:
-            lineResult = line_re.match(line)
-            if lineResult is not None:
-                try:
-                    nr1 = int(lineResult.group("nr1"))
-                    nr2 = int(lineResult.group("nr2"))
-                except ValueError:
-                    print("Input graph cannot be parsed!")
-                    exit(1)
-                sourceVertices.add(nr1)
-                targetVertices.add(nr2)
-                maxVertexNumber = max(nr1, nr2, maxVertexNumber)
-                fromNode = adjacentLookup.get(nr1, set())
-                fromNode.add(nr2)
-                adjacentLookup[nr1] = fromNode
+    # Start reading in the input file
+    for (nr1, nr2) in ReadEdges(inputFilename, inputFormat):
+        sourceVertices.add(nr1)
+        targetVertices.add(nr2)
+        maxVertexNumber = max(nr1, nr2, maxVertexNumber)
+        fromNode = adjacentLookup.get(nr1, set())
+        fromNode.add(nr2)
+        adjacentLookup[nr1] = fromNode
     uniqueSourceVertices = sourceVertices.difference(targetVertices)
     uniqueTargetVertexCount = len(targetVertices.difference(sourceVertices))
     uniqueVertexCount = len(uniqueSourceVertices) + uniqueTargetVertexCount
@@ -162,95 +363,529 @@ def ParseInputfile(inputFilename):
     return adjacentLookup, uniqueSourceVertices, uniqueVertexCount, maxVertexNumber
 
 
+# Vertex orders supported by CompactVertexIds:
+#   original: keep the relative order of the input IDs, only remove the gaps.
+#   bfs:      breadth first order starting from the source vertices, so vertices reached together are stored together.
+#   degree:   highest (in + out) degree first, so the most frequently touched vertices share the same memory.
+#   rcm:      Reverse Cuthill-McKee on the undirected graph, which keeps the neighbours of a vertex close to it.
+vertexOrders = ['original', 'bfs', 'degree', 'rcm']
+
+
+def CompactVertexIds(adjacentLookup, sourceVertices, order='original'):
+    # The bitarray and array('i') buffers of SSC2 are sized by the highest vertex ID, so remap the IDs to 0..n-1.
+    # Returns the remapped graph plus vertexIds, which maps every new ID back to its original ID.
+    startTime = timer()
+    allVertices = set(adjacentLookup)
+    for adjacent in adjacentLookup.values():
+        allVertices.update(adjacent)
+    if order == 'bfs':
+        orderedVertices = BFSVertexOrder(adjacentLookup, sourceVertices, allVertices)
+    elif order == 'degree':
+        degrees = GetVertexDegrees(adjacentLookup)
+        orderedVertices = sorted(allVertices, key=lambda vertex: (-degrees.get(vertex, 0), vertex))
+    elif order == 'rcm':
+        orderedVertices = RCMVertexOrder(adjacentLookup, allVertices)
+    else:
+        orderedVertices = sorted(allVertices)
+    # Unsigned, like the IDs of the binary input formats.
+    try:
+        vertexIds = array('Q', orderedVertices)
+    except OverflowError:
+        print("Input graph contains vertex IDs that do not fit in 64 bits!")
+        exit(1)
+    newIds = {vertex: newId for (newId, vertex) in enumerate(orderedVertices)}
+    compactLookup = dict()
+    for vertex in orderedVertices:
+        adjacent = adjacentLookup.get(vertex, None)
+        if adjacent is not None:
+            compactLookup[newIds[vertex]] = {newIds[adjacentVertex] for adjacentVertex in adjacent}
+    compactSourceVertices = {newIds[vertex] for vertex in sourceVertices}
+    print("Took %g seconds to compact %d vertex IDs using the '%s' order." % (timer() - startTime, len(vertexIds), order))
+    return compactLookup, compactSourceVertices, len(vertexIds), vertexIds
+
+
+def GetVertexDegrees(adjacentLookup):
+    degrees = dict()
+    for (vertex, adjacent) in adjacentLookup.items():
+        degrees[vertex] = degrees.get(vertex, 0) + len(adjacent)
+        for adjacentVertex in adjacent:
+            degrees[adjacentVertex] = degrees.get(adjacentVertex, 0) + 1
+    return degrees
+
+
+def BFSVertexOrder(adjacentLookup, sourceVertices, allVertices):
+    orderedVertices = []
+    visited = set()
+    # Vertices on a cycle that no source vertex reaches are picked up by the remaining start vertices.
+    for startVertex in sorted(sourceVertices) + sorted(allVertices):
+        if startVertex in visited:
+            continue
+        visited.add(startVertex)
+        vertexQueue = deque([startVertex])
+        while vertexQueue:
+            vertex = vertexQueue.popleft()
+            orderedVertices.append(vertex)
+            for adjacentVertex in sorted(adjacentLookup.get(vertex, ())):
+                if adjacentVertex not in visited:
+                    visited.add(adjacentVertex)
+                    vertexQueue.append(adjacentVertex)
+    return orderedVertices
+
+
+def RCMVertexOrder(adjacentLookup, allVertices):
+    undirectedLookup = {vertex: set() for vertex in allVertices}
+    for (vertex, adjacent) in adjacentLookup.items():
+        for adjacentVertex in adjacent:
+            undirectedLookup[vertex].add(adjacentVertex)
+            undirectedLookup[adjacentVertex].add(vertex)
+    degree = lambda vertex: (len(undirectedLookup[vertex]), vertex)
+    orderedVertices = []
+    visited = set()
+    # Every connected component starts from its vertex with the lowest degree (a pseudo-peripheral vertex).
+    for startVertex in sorted(allVertices, key=degree):
+        if startVertex in visited:
+            continue
+        visited.add(startVertex)
+        vertexQueue = deque([startVertex])
+        while vertexQueue:
+            vertex = vertexQueue.popleft()
+            orderedVertices.append(vertex)
+            for adjacentVertex in sorted(undirectedLookup[vertex] - visited, key=degree):
+                visited.add(adjacentVertex)
+                vertexQueue.append(adjacentVertex)
+    orderedVertices.reverse()
+    return orderedVertices
+
+
+def TranslateVertexIds(vertices, vertexIds):
+    if vertexIds is None:
+        return vertices
+    return {vertexIds[vertex] for vertex in vertices}
+
+
+# Cache of preprocessed graphs for compute fresh. Every cached graph is stored in its own file, named
+# <hash of the input file's contents>-<hash of the preprocessing options>.graph. index.pkl maps (input path, size,
+# mtime) to the hash of its contents, so unchanged input files do not have to be hashed again; entries whose hash has
+# no cached graph left are pruned on eviction. A file's mtime is updated whenever it is used, which gives the order
+# for the least recently used eviction. The index counts towards the cache size.
+defaultCacheDirectory = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')),
+                                     'ssc12')
+cacheVersion = 2
+
+
+def HashFile(filename, chunkSize=1 << 20):
+    contentHash = hashlib.sha256()
+    with open(filename, 'rb') as inputFile:
+        for chunk in iter(lambda: inputFile.read(chunkSize), b''):
+            contentHash.update(chunk)
+    return contentHash.hexdigest()
+
+
+def ReadCacheIndex(cacheDirectory):
+    try:
+        with open(os.path.join(cacheDirectory, 'index.pkl'), 'rb') as indexFile:
+            return pickle.load(indexFile)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, IndexError, pickle.UnpicklingError):
+        return dict()
+
+
+def GetCacheKey(cacheDirectory, inputFilename, inputFormat, order):
+    inputStat = os.stat(inputFilename)
+    inputPath = os.path.abspath(inputFilename)
+    indexKey = (inputPath, inputStat.st_size, inputStat.st_mtime_ns)
+    cacheIndex = ReadCacheIndex(cacheDirectory)
+    contentHash = cacheIndex.get(indexKey, None)
+    if contentHash is None:
+        contentHash = HashFile(inputFilename)
+        # Entries for older versions of the same file can never match again.
+        cacheIndex = {entry: entryHash for (entry, entryHash) in cacheIndex.items() if entry[0] != inputPath}
+        cacheIndex[indexKey] = contentHash
+        WriteCacheFile(os.path.join(cacheDirectory, 'index.pkl'), cacheIndex)
+    key = (cacheVersion, contentHash, inputStat.st_size, inputFormat, order)
+    return contentHash + '-' + hashlib.sha256(repr(key).encode()).hexdigest()[:16], key
+
+
+def WriteCacheFile(filename, content):
+    temporaryFilename = "%s.%d.tmp" % (filename, os.getpid())
+    with open(temporaryFilename, 'w+b') as cacheFile:
+        pickle.dump(content, cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporaryFilename, filename)
+
+
+def ReadCachedGraph(cacheDirectory, cacheKey):
+    (cacheFilename, key) = cacheKey
+    cacheFilename = os.path.join(cacheDirectory, cacheFilename + '.graph')
+    try:
+        with open(cacheFilename, 'rb') as cacheFile:
+            (storedKey, preprocessedGraph) = pickle.load(cacheFile)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, IndexError, pickle.UnpicklingError):
+        print("Removing corrupt cached graph '%s'." % cacheFilename)
+        os.remove(cacheFilename)
+        return None
+    if storedKey != key:
+        print("Removing stale cached graph '%s'." % cacheFilename)
+        os.remove(cacheFilename)
+        return None
+    os.utime(cacheFilename)
+    return preprocessedGraph
+
+
+def WriteCachedGraph(cacheDirectory, cacheKey, preprocessedGraph, cacheSize):
+    (cacheFilename, key) = cacheKey
+    cacheFilename = os.path.join(cacheDirectory, cacheFilename + '.graph')
+    WriteCacheFile(cacheFilename, (key, preprocessedGraph))
+    if os.path.getsize(cacheFilename) > cacheSize:
+        print("Preprocessed graph is larger than the cache size, not caching it.")
+        os.remove(cacheFilename)
+    EvictCachedGraphs(cacheDirectory, cacheSize)
+
+
+def EvictCachedGraphs(cacheDirectory, cacheSize):
+    indexFilename = os.path.join(cacheDirectory, 'index.pkl')
+    cachedGraphs = []
+    for filename in os.listdir(cacheDirectory):
+        if filename.endswith('.graph'):
+            cacheStat = os.stat(os.path.join(cacheDirectory, filename))
+            cachedGraphs.append((cacheStat.st_mtime, cacheStat.st_size, filename))
+    totalSize = sum(size for (_, size, _) in cachedGraphs)
+    if os.path.isfile(indexFilename):
+        totalSize += os.path.getsize(indexFilename)
+    # The least recently used graphs are evicted first.
+    keptFilenames = []
+    for (mtime, size, filename) in sorted(cachedGraphs):
+        if totalSize > cacheSize:
+            print("Evicting cached graph '%s' to stay within the cache size." % filename)
+            os.remove(os.path.join(cacheDirectory, filename))
+            totalSize -= size
+        else:
+            keptFilenames.append(filename)
+    # Prune the index entries of input files that no longer have any cached graph.
+    cachedHashes = {filename.split('-')[0] for filename in keptFilenames}
+    cacheIndex = ReadCacheIndex(cacheDirectory)
+    prunedIndex = {entry: entryHash for (entry, entryHash) in cacheIndex.items() if entryHash in cachedHashes}
+    if len(prunedIndex) != len(cacheIndex):
+        WriteCacheFile(indexFilename, prunedIndex)
+
+
+def PreprocessInputfile(inputFilename, inputFormat, order, cacheDirectory=None, cacheSize=None):
+    # Parses and compacts the input graph, or loads the result of that from the cache when it is there.
+    cacheKey = None
+    if cacheDirectory is not None:
+        try:
+            os.makedirs(cacheDirectory, exist_ok=True)
+            cacheKey = GetCacheKey(cacheDirectory, inputFilename, inputFormat, order)
+        except OSError:
+            print("Cannot use the cache directory '%s', parsing without the cache." % cacheDirectory)
+            cacheDirectory = None
+    if cacheKey is not None:
+        startTime = timer()
+        try:
+            preprocessedGraph = ReadCachedGraph(cacheDirectory, cacheKey)
+        except OSError:
+            print("Could not read from the cache directory '%s', parsing without the cache." % cacheDirectory)
+            preprocessedGraph = None
+        if preprocessedGraph is not None:
+            print("Took %g seconds to load the preprocessed graph from the cache." % (timer() - startTime))
+            return preprocessedGraph
+    (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber) = ParseInputfile(inputFilename, inputFormat)
+    (adjacentLookup, sourceVertices, maxVertexNumber, vertexIds) = CompactVertexIds(adjacentLookup, sourceVertices,
+                                                                                    order)
+    preprocessedGraph = (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds)
+    if cacheKey is not None:
+        try:
+            WriteCachedGraph(cacheDirectory, cacheKey, preprocessedGraph, cacheSize)
+        except OSError:
+            print("Could not write the preprocessed graph to the cache directory '%s'." % cacheDirectory)
+    return preprocessedGraph
+
+
 # SSC12 Algorithm (defined in several functions):
-def Closure(sourceVertices, adjacentLookup, alpha, beta, nrOfVertices, maxVertexNumber):
-    # Setup multiprocessing:
-    cpuCount = min(multiprocessing.cpu_count(), len(sourceVertices))
-    print("Beginning closure processing with %d parallel threads and thresholds alpha = %g and beta = %g..." %
-          (cpuCount, alpha, beta))
+# Execution backends for Closure, as (queue type, worker type) pairs with the same interface:
+#   process: a multiprocessing.Process per CPU, every job and result is pickled through a multiprocessing.Queue.
+#   thread:  a threading.Thread per CPU sharing the graph and the results without any copying. Only runs in parallel
+#            on a free-threaded Python build, otherwise the GIL serializes the workers.
+#   serial:  no workers at all, the main process computes every source vertex itself (useful for profiling).
+executors = {'process': (multiprocessing.Queue, multiprocessing.Process),
+             'thread': (queue.Queue, threading.Thread),
+             'serial': None}
+
+
+def Closure(sourceVertices, adjacentLookup, alpha, beta, nrOfVertices, maxVertexNumber, pairsFilename=None,
+            vertexIds=None, executor='process', workerLimits=None, spillDirectory=None, checkpointFilename=None,
+            checkpointInterval=300, checkpoint=None, inputFingerprint=None, outputFilename=None):
+    # workerLimits is what GetWorkerLimits returns for the jobs left to do, by default one worker per CPU without a
+    # memory budget. checkpoint is a checkpoint read by ReadCheckpoint to resume from, outputFilename is only recorded
+    # in the new checkpoints so that a resumed run writes to the same files.
     sourceVertexCount = len(sourceVertices)
-    closureSet = set()
-    vertexQueue = multiprocessing.Queue()
-    SSCQueue = multiprocessing.Queue()
-    processList = []
+    # The union of all closures is kept as a bitmap, so the collector needs a fixed n / 8 bytes however many
+    # results come in. completedBitmap marks the source vertices whose closure has been collected.
+    closureBitmap = bitarray(maxVertexNumber)
+    closureBitmap.setall(False)
+    completedBitmap = bitarray(maxVertexNumber)
+    completedBitmap.setall(False)
+    pairsOffset = None
+    pairsIndex = dict()
+    # A checkpoint only fits a run on the same graph with the same vertex numbering: inputFingerprint identifies the
+    # contents of the input file(s) and the hash of vertexIds the numbering chosen by CompactVertexIds.
+    vertexIdsHash = None if vertexIds is None else hashlib.sha256(vertexIds.tobytes()).hexdigest()
+    graphFingerprint = (nrOfVertices, maxVertexNumber, sourceVertexCount, inputFingerprint, vertexIdsHash)
+    if checkpoint is not None:
+        if checkpoint['graph'] != graphFingerprint or (checkpoint['pairsOffset'] is None) != (pairsFilename is None):
+            print("Checkpoint '%s' belongs to a different graph or pairs setting, cannot resume!" % checkpointFilename)
+            exit(1)
+        closureBitmap = checkpoint['closure']
+        completedBitmap = checkpoint['completed']
+        pairsOffset = checkpoint['pairsOffset']
+        pairsIndex = checkpoint['pairsIndex']
+        print("Resuming from checkpoint '%s' with %d out of %d jobs completed." %
+              (checkpointFilename, completedBitmap.count(), sourceVertexCount))
+    remainingVertices = [vertex for vertex in sourceVertices if not completedBitmap[vertex]]
+
+    # Setup multiprocessing:
+    if workerLimits is None:
+        workerLimits = GetWorkerLimits(executor, len(remainingVertices))
+    (cpuCount, queueSize, spillThreshold) = workerLimits
+    if spillThreshold is not None:
+        spillDirectory = tempfile.mkdtemp(prefix='ssc12_spill_', dir=spillDirectory)
+    print("Beginning closure processing with %d parallel %s workers and thresholds alpha = %g and beta = %g..." %
+          (cpuCount, executor, alpha, beta))
+    if executor == 'thread' and getattr(sys, '_is_gil_enabled', lambda: True)():
+        print("Warning: this Python interpreter has a GIL, so the thread workers will not run in parallel.")
 
     alphaThreshold = nrOfVertices / alpha
     betaThreshold = nrOfVertices / beta
     print("Thresholds in terms of n: alpha = %g, beta = %g, n = %d" % (alphaThreshold, betaThreshold, nrOfVertices))
+    workerArgs = (adjacentLookup, alphaThreshold, betaThreshold, maxVertexNumber, pairsFilename is not None, vertexIds)
+
+    if executor == 'serial':
+        results = SSCResults(iter(remainingVertices), *workerArgs)
+    else:
+        (QueueType, WorkerType) = executors[executor]
+        # A maxsize of 0 means unbounded; with a memory budget a full queue blocks the producer (backpressure).
+        vertexQueue = QueueType(queueSize)
+        SSCQueue = QueueType(queueSize)
+        processList = []
+        for _ in range(0, cpuCount):
+            processList.append(WorkerType(target=SSCWorker,
+                                          args=(vertexQueue, SSCQueue, spillThreshold, spillDirectory) + workerArgs,
+                                          daemon=True))
+        adderProcess = WorkerType(target=SourceVertexQueueAdder, args=(remainingVertices, vertexQueue, cpuCount),
+                                  daemon=True)
 
-    for _ in range(0, cpuCount):
-        processList.append(multiprocessing.Process(target=SSCWorker, args=(vertexQueue, SSCQueue, adjacentLookup,
-                                                                           alphaThreshold, betaThreshold, maxVertexNumber),
-                                                   daemon=True))
-    adderProcess = multiprocessing.Process(target=SourceVertexQueueAdder, args=(sourceVertices, vertexQueue, cpuCount),
-                                           daemon=True)
-
-    for process in processList:
-        process.start()
-    adderProcess.start()
-
-    doneCounter = 0
-    while doneCounter < sourceVertexCount:
-        ssc = SSCQueue.get()
-        closureSet = closureSet.union(ssc)
+        for process in processList:
+            process.start()
+        adderProcess.start()
+        results = (SSCQueue.get() for _ in range(0, len(remainingVertices)))
+
+    pairsFile = None
+    if pairsFilename is not None and pairsOffset is not None:
+        # Anything written after the checkpoint is not in its index, so it is dropped and computed again.
+        pairsFile = open(pairsFilename, 'r+b')
+        pairsFile.seek(pairsOffset)
+        pairsFile.truncate()
+    elif pairsFilename is not None:
+        pairsFile = open(pairsFilename, 'w+b')
+        pairsFile.write(closurePairsMagic)
+
+    doneCounter = sourceVertexCount - len(remainingVertices)
+    spilledCounter = 0
+    checkpointCounter = 0
+    checkpointTime = 0
+    lastCheckpoint = timer()
+    for (sourceVertex, ssc, encodedPairs) in results:
+        if isinstance(ssc, str):
+            (ssc, encodedPairs) = ReadSpilledResult(ssc)
+            spilledCounter += 1
+        for vertex in ssc:
+            closureBitmap[vertex] = True
+        del ssc
+        if pairsFile is not None:
+            (originalSource, encodedClosure) = encodedPairs
+            pairsIndex[originalSource] = (pairsFile.tell(), len(encodedClosure))
+            pairsFile.write(encodedClosure)
+        completedBitmap[sourceVertex] = True
         doneCounter += 1
+        if checkpointFilename is not None and timer() - lastCheckpoint >= checkpointInterval:
+            checkpointStartTime = timer()
+            if pairsFile is not None:
+                pairsFile.flush()
+                os.fsync(pairsFile.fileno())
+            WriteCheckpoint(checkpointFilename, {'graph': graphFingerprint, 'closure': closureBitmap,
+                                                 'completed': completedBitmap,
+                                                 'pairsOffset': None if pairsFile is None else pairsFile.tell(),
+                                                 'pairsIndex': pairsIndex, 'outputFilename': outputFilename,
+                                                 'pairsFilename': pairsFilename})
+            lastCheckpoint = timer()
+            checkpointTime += lastCheckpoint - checkpointStartTime
+            checkpointCounter += 1
         sys.stdout.write("\rProgress: %d out of %d jobs completed." % (doneCounter, sourceVertexCount))
         sys.stdout.flush()
-        if adderProcess.exitcode is not None and adderProcess.exitcode != 0:
-            print("\nEncountered an error while adding jobs! Job queue was full.")
-            exit(1)
     print("\r")
-    return closureSet
+    if checkpointFilename is not None:
+        print("Wrote %d checkpoints in %g seconds." % (checkpointCounter, checkpointTime))
+    if pairsFile is not None:
+        WriteClosurePairsIndex(pairsFile, pairsIndex)
+        pairsFile.close()
+    if spillThreshold is not None:
+        print("%d out of %d results were spilled to disk." % (spilledCounter, sourceVertexCount))
+        shutil.rmtree(spillDirectory, ignore_errors=True)
+    if executor != 'serial':
+        # Every worker has seen its sentinel by now. Joining them also reaps the worker processes, so that their peak
+        # memory usage shows up in RUSAGE_CHILDREN.
+        for process in processList:
+            process.join()
+        adderProcess.join()
+    return set(closureBitmap.search(bitarray('1')))
 
 
-def SourceVertexQueueAdder(sourceVertices, vertexQueue, cpuCount):
-    # Prepare multiprocessing jobs:
-    queueSize = 0
+def WriteCheckpoint(checkpointFilename, checkpoint):
+    # Written to a temporary file that replaces the previous checkpoint, so a crash never leaves a partial one behind.
+    temporaryFilename = checkpointFilename + ".tmp"
+    with open(temporaryFilename, 'w+b') as checkpointFile:
+        pickle.dump(checkpoint, checkpointFile, protocol=pickle.HIGHEST_PROTOCOL)
+        checkpointFile.flush()
+        os.fsync(checkpointFile.fileno())
+    os.replace(temporaryFilename, checkpointFilename)
+
+
+def ReadCheckpoint(checkpointFilename):
     try:
-        for sourceVertex in sourceVertices:
-            vertexQueue.put(sourceVertex, block=True)
-            queueSize += 1
-        # Insert sentinel values:
-        for i in range(0, cpuCount):
-            vertexQueue.put(None, block=True)
-            queueSize += 1
-    except Full:
-        vertexQueue.close()
-        vertexQueue.cancel_join_thread()
-        vertexQueue.join_thread()
+        with open(checkpointFilename, 'r+b') as checkpointFile:
+            return pickle.load(checkpointFile)
+    except (EOFError, pickle.UnpicklingError):
+        print("Checkpoint '%s' is corrupt!" % checkpointFilename)
         exit(1)
 
 
-def SSCWorker(vertexQueue, SSCQueue, adjacentLookup, alphaThreshold, betaThreshold, maxVertexNumber):
+# Rough size of a vertex in a Python set of ints (hash table slot plus the int object), used for the memory budget.
+bytesPerSetVertex = 64
+
+
+def GetWorkerLimits(executor, jobCount, memoryBudget=None, maxVertexNumber=0):
+    # Returns the number of workers for Closure, and the queue size and spill threshold of GetMemoryBudgetLimits (a
+    # queue size of 0 and no spill threshold without a memory budget).
+    if executor == 'serial':
+        if memoryBudget is not None:
+            print("The serial executor only holds a single result at a time, ignoring the memory budget.")
+        return 1, 0, None
+    cpuCount = min(multiprocessing.cpu_count(), max(jobCount, 1))
+    if memoryBudget is None:
+        return cpuCount, 0, None
+    return GetMemoryBudgetLimits(memoryBudget, cpuCount, maxVertexNumber)
+
+
+def GetMemoryBudgetLimits(memoryBudget, cpuCount, maxVertexNumber):
+    # Every worker needs its SSC2 buffers plus room for the closure it is computing, and the collector needs its
+    # bitmap. What remains is shared by the results waiting in the queue and the one being collected; results
+    # (the closure plus its encoded pairs) larger than their share are spilled to disk instead of being sent through
+    # the queue. Runs fewer workers if not all of them fit in the budget. Returns the number of workers, the queue
+    # size and that share in bytes.
+    workerCost = 2 * 4 * maxVertexNumber + maxVertexNumber // 8 + bytesPerSetVertex * maxVertexNumber
+    fittingWorkers = (memoryBudget - maxVertexNumber // 8) // workerCost
+    if fittingWorkers < 1:
+        print("A memory budget of %d bytes is below the estimated %d bytes that a single worker needs!" %
+              (memoryBudget, workerCost + maxVertexNumber // 8))
+        exit(1)
+    if fittingWorkers < cpuCount:
+        print("Only %d out of %d workers fit in the memory budget." % (fittingWorkers, cpuCount))
+        cpuCount = fittingWorkers
+    queueSize = 2 * cpuCount
+    remainingBudget = memoryBudget - cpuCount * workerCost - maxVertexNumber // 8
+    spillThreshold = max(remainingBudget // (queueSize + 1), 0)
+    print("Memory budget of %d bytes: at most %d jobs and %d results in flight, results larger than %d bytes "
+          "are spilled to disk." % (memoryBudget, queueSize, queueSize, spillThreshold))
+    return cpuCount, queueSize, spillThreshold
+
+
+def SourceVertexQueueAdder(sourceVertices, vertexQueue, cpuCount):
+    # Prepare multiprocessing jobs. With a memory budget the queue is bounded and put blocks until a worker takes a
+    # job, so the adder simply waits instead of failing:
+    for sourceVertex in sourceVertices:
+        vertexQueue.put(sourceVertex, block=True)
+    # Insert sentinel values:
+    for i in range(0, cpuCount):
+        vertexQueue.put(None, block=True)
+
+
+def SSCWorker(vertexQueue, SSCQueue, spillThreshold, spillDirectory, adjacentLookup, alphaThreshold, betaThreshold,
+              maxVertexNumber, encodePairs, vertexIds):
+    # Processes source vertices from the queue until it hits a sentinel value.
+    for (sourceVertex, ssc, encodedPairs) in SSCResults(iter(vertexQueue.get, None), adjacentLookup, alphaThreshold,
+                                                        betaThreshold, maxVertexNumber, encodePairs, vertexIds):
+        if spillThreshold is not None and EstimateResultSize(ssc, encodedPairs) > spillThreshold:
+            # The encoded pairs go into the spill file too, so only the file name is left in the queue.
+            ssc = SpillResult(ssc, encodedPairs, spillDirectory)
+            encodedPairs = None
+        SSCQueue.put((sourceVertex, ssc, encodedPairs), block=True)
+
+
+def EstimateResultSize(ssc, encodedPairs):
+    resultSize = len(ssc) * bytesPerSetVertex
+    if encodedPairs is not None:
+        resultSize += len(encodedPairs[1])
+    return resultSize
+
+
+def SpillResult(ssc, encodedPairs, spillDirectory):
+    # Returns the name of the file that the result was written to, which takes its place in the queue.
+    (spillFile, spillFilename) = tempfile.mkstemp(suffix='.ssc', dir=spillDirectory)
+    with os.fdopen(spillFile, 'wb') as spillFile:
+        pickle.dump((EncodeClosure(ssc), encodedPairs), spillFile, protocol=pickle.HIGHEST_PROTOCOL)
+    return spillFilename
+
+
+def ReadSpilledResult(spillFilename):
+    with open(spillFilename, 'rb') as spillFile:
+        (encodedSSC, encodedPairs) = pickle.load(spillFile)
+    os.remove(spillFilename)
+    return DecodeClosure(encodedSSC), encodedPairs
+
+
+def SSCResults(vertices, adjacentLookup, alphaThreshold, betaThreshold, maxVertexNumber, encodePairs, vertexIds):
+    # Yields the result of every vertex, starting with SSC1 and permanently switching to SSC2 once the thresholds
+    # are exceeded.
     thresholdExceeded = False
     vertex = None
-    while True:
-        vertex = vertexQueue.get(block=True)
-        if vertex is not None:
-            ssc = SSC1(adjacentLookup, vertex, alphaThreshold, betaThreshold)
-            if ssc is not None:
-                SSCQueue.put(ssc)
-            else:
-                thresholdExceeded = True
-                print("Thread switched to SSC2.")
-                break
+    # The frontier lists of SSC1Fused are reused for every source vertex.
+    frontierBuffers = ([], [])
+    for vertex in vertices:
+        ssc = SSC1Fused(adjacentLookup, vertex, alphaThreshold, betaThreshold, *frontierBuffers)
+        if ssc is not None:
+            yield SSCResult(vertex, ssc, encodePairs, vertexIds)
         else:
+            thresholdExceeded = True
+            print("Thread switched to SSC2.")
             break
     if thresholdExceeded:
-        emptyList = [-1] * maxVertexNumber
-        bigDeltaTC = array('i', emptyList)
-        smallDeltaTC = array('i', emptyList)
-        del emptyList
-        d = bitarray(maxVertexNumber)
-        SSCQueue.put(SSC2(adjacentLookup, vertex, bigDeltaTC, smallDeltaTC, d, maxVertexNumber))
-        while True:
-            vertex = vertexQueue.get(block=True)
-            if vertex is not None:
-                SSCQueue.put(SSC2(adjacentLookup, vertex, bigDeltaTC, smallDeltaTC, d, maxVertexNumber))
-            else:
-                break
+        (bigDeltaTC, smallDeltaTC, d) = CreateSSC2Buffers(maxVertexNumber)
+        ssc = SSC2(adjacentLookup, vertex, bigDeltaTC, smallDeltaTC, d, maxVertexNumber)
+        yield SSCResult(vertex, ssc, encodePairs, vertexIds)
+        for vertex in vertices:
+            ssc = SSC2(adjacentLookup, vertex, bigDeltaTC, smallDeltaTC, d, maxVertexNumber)
+            yield SSCResult(vertex, ssc, encodePairs, vertexIds)
+
+
+def SSCResult(sourceVertex, ssc, encodePairs, vertexIds):
+    # The pairs encoding is done in the workers so that it runs in parallel; the main process only appends bytes.
+    # Pairs are stored with the original vertex IDs, so the pairs file does not depend on the compaction order.
+    if encodePairs:
+        originalSource = sourceVertex if vertexIds is None else vertexIds[sourceVertex]
+        return sourceVertex, ssc, (originalSource, EncodeClosure(TranslateVertexIds(ssc, vertexIds)))
+    return sourceVertex, ssc, None
 
 
+def CreateSSC2Buffers(maxVertexNumber):
+    emptyList = [-1] * maxVertexNumber
+    bigDeltaTC = array('i', emptyList)
+    smallDeltaTC = array('i', emptyList)
+    del emptyList
+    d = bitarray(maxVertexNumber)
+    return bigDeltaTC, smallDeltaTC, d
+
+
+# Reference implementation of SSC1, following Fig. 5 of the paper. SSC1Fused is the one used for computing.
 def SSC1(adjacentLookup, sourceVertex, alphaThreshold, betaThreshold):
     tc = set()
     tc.add(sourceVertex)
@@ -267,6 +902,47 @@ def SSC1(adjacentLookup, sourceVertex, alphaThreshold, betaThreshold):
     return tc
 
 
+def SSC1Fused(adjacentLookup, sourceVertex, alphaThreshold, betaThreshold, bigDeltaTC, smallDeltaTC, levelCosts=None):
+    # Gives exactly the same result as SSC1, but computes the costs of a level while expanding it in the same pass
+    # over bigDeltaTC, and adds new vertices to tc in place instead of building new sets on every level.
+    # bigDeltaTC and smallDeltaTC are lists that the caller can reuse for every source vertex.
+    # If levelCosts is a list, the (C_smallDelta, C_bigDelta, end time) of every completed level is appended to it.
+    tc = set()
+    tc.add(sourceVertex)
+    del bigDeltaTC[:]
+    bigDeltaTC.append(sourceVertex)
+    while len(bigDeltaTC) != 0:
+        # The part of the costs that does not depend on the adjacent vertices is known before the expansion.
+        tcSize = len(tc)
+        costSmallDelta = tcSize * len(bigDeltaTC)
+        costBigDelta = tcSize + len(bigDeltaTC)
+        thresholdExceeded = costSmallDelta > alphaThreshold or costBigDelta > betaThreshold
+        del smallDeltaTC[:]
+        for vertex in bigDeltaTC:
+            if thresholdExceeded:
+                break
+            adjacent = adjacentLookup.get(vertex, None)
+            if adjacent is not None:
+                costSmallDelta += len(adjacent)
+                if costSmallDelta > alphaThreshold:
+                    thresholdExceeded = True
+                    break
+                for adjacentVertex in adjacent:
+                    if adjacentVertex not in tc:
+                        tc.add(adjacentVertex)
+                        smallDeltaTC.append(adjacentVertex)
+        if thresholdExceeded:
+            # Report the same costs as SSC1 does, even though the expansion was cut short and tc already grew.
+            costSmallDelta = tcSize * len(bigDeltaTC) + sum(len(adjacentLookup.get(vertex, ())) for vertex in bigDeltaTC)
+            print(str.format("Thresholds violated with C_smallDelta = {0} and C_bigDelta = {1}", costSmallDelta,
+                             costBigDelta))
+            return None
+        if levelCosts is not None:
+            levelCosts.append((costSmallDelta, costBigDelta, timer()))
+        (bigDeltaTC, smallDeltaTC) = (smallDeltaTC, bigDeltaTC)
+    return tc
+
+
 def ComputeSSC1Cost(adjacentLookup, bigDeltaTC, tc):
     costSmallDelta = 0
     for vertex in bigDeltaTC:
@@ -316,6 +992,196 @@ def GetAllAdjacentNodesFromSet(adjacentLookup, inputSet):
     return resultSet
 
 
+# Algorithm IDs, in the same order as in MassifParser.py:
+algorithmNames = ["SemiNaive", "Smart", "SSC1", "SSC2", "SSC12"]
+computeAlgorithms = ["SSC12", "SemiNaive", "Smart"]
+
+
+# Semi-naive and Smart evaluation of the full transitive closure relation, for comparison with SSC12.
+# Relations are stored grouped by their first column, as a dict from a vertex to the set of vertices it is related to,
+# just like adjacentLookup. Joins are done a group at a time: the groups that one vertex joins with are found by
+# intersecting its group with the keys of the other relation and unioned in a single set.union call, so the only loop
+# in Python is over the groups, not over the individual tuples.
+def RelationClosure(algorithm, sourceVertices, adjacentLookup, pairsFilename=None, vertexIds=None):
+    # Returns the same union of source vertex closures as Closure does, and writes the same pairs file.
+    print("Beginning %s transitive closure evaluation of the full relation..." % algorithm)
+    if algorithm == 'SemiNaive':
+        relation = SemiNaive(adjacentLookup)
+    else:
+        relation = Smart(adjacentLookup)
+    print("Transitive closure relation size: %d" % sum(len(reached) for reached in relation.values()))
+    closureSet = set()
+    pairsIndex = dict()
+    pairsFile = None
+    if pairsFilename is not None:
+        pairsFile = open(pairsFilename, 'w+b')
+        pairsFile.write(closurePairsMagic)
+    for sourceVertex in sourceVertices:
+        # The SSC of a source vertex includes the source vertex itself.
+        ssc = relation.get(sourceVertex, set()) | {sourceVertex}
+        closureSet.update(ssc)
+        if pairsFile is not None:
+            (originalSource, encodedClosure) = SSCResult(sourceVertex, ssc, True, vertexIds)[2]
+            pairsIndex[originalSource] = (pairsFile.tell(), len(encodedClosure))
+            pairsFile.write(encodedClosure)
+    if pairsFile is not None:
+        WriteClosurePairsIndex(pairsFile, pairsIndex)
+        pairsFile.close()
+    return closureSet
+
+
+def Compose(leftRelation, rightRelation):
+    # leftRelation o rightRelation: all (x, z) such that (x, y) is in leftRelation and (y, z) is in rightRelation.
+    result = dict()
+    rightKeys = rightRelation.keys()
+    getRightGroup = rightRelation.__getitem__
+    for (vertex, related) in leftRelation.items():
+        joinedVertices = rightKeys & related
+        if len(joinedVertices) != 0:
+            result[vertex] = set().union(*map(getRightGroup, joinedVertices))
+    return result
+
+
+def SemiNaive(adjacentLookup):
+    # TC := E, delta := E; repeat delta := (delta o E) - TC, TC := TC + delta until delta is empty.
+    tc = {vertex: set(adjacent) for (vertex, adjacent) in adjacentLookup.items() if len(adjacent) != 0}
+    delta = tc
+    iterations = 0
+    while len(delta) != 0:
+        iterations += 1
+        newDelta = dict()
+        for (vertex, reached) in Compose(delta, adjacentLookup).items():
+            reached.difference_update(tc[vertex])
+            if len(reached) != 0:
+                tc[vertex].update(reached)
+                newDelta[vertex] = reached
+        delta = newDelta
+    print("SemiNaive finished after %d iterations." % iterations)
+    return tc
+
+
+def Smart(adjacentLookup):
+    # Logarithmic evaluation by repeated squaring. After iteration i, P holds the pairs with a path of length
+    # 1 .. 2^i - 1 and Q the pairs whose shortest path has length exactly 2^i:
+    # P := Q + P + (P o Q), Q := (Q o Q) - P, until Q is empty.
+    q = {vertex: set(adjacent) for (vertex, adjacent) in adjacentLookup.items() if len(adjacent) != 0}
+    p = dict()
+    iterations = 0
+    while len(q) != 0:
+        iterations += 1
+        pq = Compose(p, q)
+        for (vertex, reached) in q.items():
+            p.setdefault(vertex, set()).update(reached)
+        for (vertex, reached) in pq.items():
+            p.setdefault(vertex, set()).update(reached)
+        newQ = dict()
+        for (vertex, reached) in Compose(q, q).items():
+            reached.difference_update(p[vertex])
+            if len(reached) != 0:
+                newQ[vertex] = reached
+        q = newQ
+    print("Smart finished after %d iterations." % iterations)
+    return p
+
+
+# Default thresholds from the paper, used when neither the command line nor the preprocessed graph provides them.
+defaultAlpha = Fraction(1, 8)
+defaultBeta = Fraction(1, 128)
+
+
+def Calibrate(adjacentLookup, sourceVertices, nrOfVertices, maxVertexNumber, sampleSize, seed=None):
+    # Runs every sampled source vertex to completion under both SSC1 and SSC2 and records the costs and the elapsed
+    # time of every SSC1 level. The sample is then replayed in the order a worker would process it, which switches to
+    # SSC2 for good at the first vertex that exceeds the thresholds and also loses the SSC1 levels it already ran for
+    # that vertex. The thresholds are fitted so that this replay takes the least total time.
+    startTime = timer()
+    sample = random.Random(seed).sample(sorted(sourceVertices), min(sampleSize, len(sourceVertices)))
+    sample.sort()
+    (bigDeltaTC, smallDeltaTC, d) = CreateSSC2Buffers(maxVertexNumber)
+    frontierBuffers = ([], [])
+    measurements = []
+    for sourceVertex in sample:
+        (levelCosts, ssc1Time) = MeasureSSC1Costs(adjacentLookup, sourceVertex, frontierBuffers)
+        ssc2StartTime = timer()
+        SSC2(adjacentLookup, sourceVertex, bigDeltaTC, smallDeltaTC, d, maxVertexNumber)
+        ssc2Time = timer() - ssc2StartTime
+        measurements.append((levelCosts, ssc1Time, ssc2Time))
+
+    # Switching at vertex i needs every earlier vertex to stay within the thresholds, so the lowest such thresholds
+    # are the highest costs seen before i; those also make vertex i abort as early as possible. A threshold of 1 is
+    # the lowest that can be expressed as alpha or beta.
+    ssc2Suffix = [0] * (len(measurements) + 1)
+    for i in range(len(measurements) - 1, -1, -1):
+        ssc2Suffix[i] = ssc2Suffix[i + 1] + measurements[i][2]
+    ssc1Prefix = 0
+    (alphaThreshold, betaThreshold) = (1, 1)
+    best = None
+    for (i, (levelCosts, ssc1Time, ssc2Time)) in enumerate(measurements):
+        for (costSmallDelta, costBigDelta, elapsedTime) in levelCosts:
+            if costSmallDelta > alphaThreshold or costBigDelta > betaThreshold:
+                totalTime = ssc1Prefix + elapsedTime + ssc2Suffix[i]
+                # On a tie prefer the later switch, which keeps more vertices in SSC1.
+                if best is None or totalTime <= best[0]:
+                    best = (totalTime, alphaThreshold, betaThreshold, i)
+                break
+        ssc1Prefix += ssc1Time
+        alphaThreshold = max(alphaThreshold, max(costs[0] for costs in levelCosts))
+        betaThreshold = max(betaThreshold, max(costs[1] for costs in levelCosts))
+    if best is None or ssc1Prefix <= best[0]:
+        best = (ssc1Prefix, alphaThreshold, betaThreshold, None)
+    (totalTime, alphaThreshold, betaThreshold, switchIndex) = best
+    alpha = Fraction(nrOfVertices, alphaThreshold)
+    beta = Fraction(nrOfVertices, betaThreshold)
+    print("Took %g seconds to calibrate on %d source vertices." % (timer() - startTime, len(sample)))
+    print("Sample time with only SSC1: %g seconds, only SSC2: %g seconds, calibrated: %g seconds (%s)." %
+          (ssc1Prefix, ssc2Suffix[0], totalTime,
+           "never switches to SSC2" if switchIndex is None else "switches to SSC2 at vertex %d" % (switchIndex + 1)))
+    print("Calibrated thresholds: alpha = %g, beta = %g (in terms of n: alpha = %d, beta = %d)" %
+          (alpha, beta, alphaThreshold, betaThreshold))
+    return alpha, beta
+
+
+def MeasureSSC1Costs(adjacentLookup, sourceVertex, frontierBuffers):
+    # Runs SSC1Fused without thresholds and returns the costs of every level together with the time elapsed at the
+    # end of that level, and the total time.
+    levelCosts = []
+    startTime = timer()
+    SSC1Fused(adjacentLookup, sourceVertex, float('inf'), float('inf'), *frontierBuffers, levelCosts)
+    totalTime = timer() - startTime
+    return [(costSmallDelta, costBigDelta, endTime - startTime) for (costSmallDelta, costBigDelta, endTime) in levelCosts], totalTime
+
+
+def Benchmark(adjacentLookup, sourceVertices, nrOfVertices, alpha, beta, sampleSize=None, seed=None):
+    # Times the reference SSC1 against SSC1Fused on the same source vertices, without thresholds and with the given
+    # alpha and beta, and exits with an error if they disagree on any result.
+    vertices = sorted(sourceVertices)
+    if sampleSize is not None:
+        vertices = random.Random(seed).sample(vertices, min(sampleSize, len(vertices)))
+    frontierBuffers = ([], [])
+    print("Benchmarking SSC1 against SSC1Fused on %d source vertices." % len(vertices))
+    for (alphaThreshold, betaThreshold) in [(float('inf'), float('inf')), (nrOfVertices / alpha, nrOfVertices / beta)]:
+        # Both print the same threshold violations, which would only drown out the timings.
+        with open(os.devnull, 'w') as devnull:
+            standardOutput = sys.stdout
+            sys.stdout = devnull
+            try:
+                startTime = timer()
+                referenceResults = [SSC1(adjacentLookup, vertex, alphaThreshold, betaThreshold) for vertex in vertices]
+                referenceTime = timer() - startTime
+                startTime = timer()
+                fusedResults = [SSC1Fused(adjacentLookup, vertex, alphaThreshold, betaThreshold, *frontierBuffers)
+                                for vertex in vertices]
+                fusedTime = timer() - startTime
+            finally:
+                sys.stdout = standardOutput
+        if referenceResults != fusedResults:
+            print("SSC1Fused gives different results than SSC1!")
+            exit(1)
+        print("Thresholds alpha = %g, beta = %g (%d aborted): SSC1 %g seconds, SSC1Fused %g seconds, speedup %.2fx." %
+              (alphaThreshold, betaThreshold, referenceResults.count(None), referenceTime, fusedTime,
+               referenceTime / fusedTime if fusedTime > 0 else float('inf')))
+
+
 # Part of an experiment to run the SSC12 algorithm across multiple (EC2) instances. Still WIP.
 def ExecuteRemoteCommand(command, hostname, pemfile, username='ec2-user'):
     try:
@@ -333,10 +1199,9 @@ def ExecuteRemoteCommand(command, hostname, pemfile, username='ec2-user'):
         print("Error connecting to instance!")
 
 
-def WritePreprocessedGraphToFile(adjacentLookup, sourceVertices, vertexCount, maxVertexNumber,
+def WritePreprocessedGraphToFile(adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds,
                                  graphFilename, sourceVerticesFilename, overwrite, verticesSplit=None):
-    with open(graphFilename, 'w+b') as graphFile:
-        pickle.dump((adjacentLookup, vertexCount, maxVertexNumber), graphFile, protocol=pickle.HIGHEST_PROTOCOL)
+    WritePreprocessedGraph(adjacentLookup, vertexCount, maxVertexNumber, vertexIds, None, graphFilename)
     sourceVerticesList = list(sourceVertices)
     if verticesSplit is not None and verticesSplit >= 1:
         chunkSize = max(len(sourceVertices) // int(verticesSplit), 1)
@@ -352,55 +1217,327 @@ def WritePreprocessedGraphToFile(adjacentLookup, sourceVertices, vertexCount, ma
             pickle.dump(sourceVertices, sourceVerticesFile, protocol=pickle.HIGHEST_PROTOCOL)
 
 
-def ReadPreprocessedGraphFromFile(graphFilename, sourceVerticesFilename):
+def WritePreprocessedGraph(adjacentLookup, vertexCount, maxVertexNumber, vertexIds, calibration, graphFilename):
+    # calibration is either None or the (alpha, beta) tuple found by the calibrate command.
+    # Written to a temporary file first, so that calibrating never leaves a half written graph behind.
+    temporaryFilename = graphFilename + ".tmp"
+    with open(temporaryFilename, 'w+b') as graphFile:
+        pickle.dump((adjacentLookup, vertexCount, maxVertexNumber, vertexIds, calibration), graphFile,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporaryFilename, graphFilename)
+
+
+def ReadPreprocessedGraph(graphFilename):
     with open(graphFilename, 'r+b') as graphFile:
-        (adjacentLookup, vertexCount, maxVertexNumber) = pickle.load(graphFile)
+        preprocessedGraph = pickle.load(graphFile)
+    # Older graph files do not contain the vertexIds mapping and/or the calibration.
+    preprocessedGraph = tuple(preprocessedGraph) + (None,) * (5 - len(preprocessedGraph))
+    return preprocessedGraph
+
+
+def ReadPreprocessedGraphFromFile(graphFilename, sourceVerticesFilename):
+    (adjacentLookup, vertexCount, maxVertexNumber, vertexIds, calibration) = ReadPreprocessedGraph(graphFilename)
     with open(sourceVerticesFilename, 'r+b') as sourceVerticesFile:
         sourceVertices = pickle.load(sourceVerticesFile)
-    return adjacentLookup, sourceVertices, vertexCount, maxVertexNumber
+    return adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds, calibration
+
+
+def ReportPeakMemory(workerProcesses=False):
+    # ru_maxrss is in kilobytes on Linux, but in bytes on Mac OS X. RUSAGE_CHILDREN only covers worker processes that
+    # have been joined, and is only reported when the computation ran in worker processes.
+    if resource is None:
+        return
+    unit = 1 if sys.platform == 'darwin' else 1024
+    mainUsage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    if workerProcesses:
+        workerUsage = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+        print("Peak memory usage: %d bytes in the main process, %d bytes in the largest worker process." %
+              (mainUsage, workerUsage))
+    else:
+        print("Peak memory usage: %d bytes." % mainUsage)
 
 
-def WriteSSCOutputToFile(closure, outputFilename, inputFilename, elapsedTime):
+def WriteSSCOutputToFile(closure, outputFilename, inputFilename, elapsedTime, algorithm='SSC12',
+                         workerProcesses=False):
     sortedClosure = sorted(closure)
     print("Elapsed time: " + str(elapsedTime) + " seconds.")
     print("Closure Size: " + str(len(sortedClosure)))
+    ReportPeakMemory(workerProcesses)
     print("Writing closure output to file...")
     with open(outputFilename, 'w') as outputFile:
-        outputFile.write(str.format("# Run of SSC12 on input {0}\n", inputFilename))
+        outputFile.write(str.format("# Run of {0} on input {1}\n", algorithm, inputFilename))
         outputFile.write(str.format("# Elapsed time: {0} seconds\n", elapsedTime))
         outputFile.write('"Vertex"\n')
         for vertex in sortedClosure:
             outputFile.write("%s\n" % str(vertex))
 
 
+# Pairs file format (written by compute --pairs):
+# <magic><block><block>...<pickled index><8 byte little endian offset of the index>
+# The index maps every source vertex to the (offset, length) of its block, so a single closure can be decoded
+# without scanning the file. Each block starts with one encoding byte and the number of vertices, followed by:
+#   delta:  the sorted vertex IDs as gaps between consecutive IDs, stored as varints.
+#   runs:   runs of consecutive IDs as (gap to the start of the run, run length - 1) varint pairs.
+#   bitmap: the lowest ID and the span as varints, followed by a bitmap covering the span.
+# The encoder picks whichever of the three is the smallest for the closure at hand.
+closurePairsMagic = b'SSCPAIRS\x01'
+closureEncodingDelta = 0
+closureEncodingRuns = 1
+closureEncodingBitmap = 2
+
+
+def EncodeVarint(value, output):
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def DecodeVarint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
+
+
+def EncodeClosure(closure):
+    sortedClosure = sorted(closure)
+    count = len(sortedClosure)
+    deltaPayload = bytearray()
+    runsPayload = bytearray()
+    previous = 0
+    runStart = None
+    runEnd = None
+    for vertex in sortedClosure:
+        EncodeVarint(vertex - previous, deltaPayload)
+        previous = vertex
+        if runStart is not None and vertex == runEnd + 1:
+            runEnd = vertex
+        else:
+            if runStart is not None:
+                EncodeVarint(runEnd - runStart, runsPayload)
+            EncodeVarint(vertex - (0 if runEnd is None else runEnd + 1), runsPayload)
+            runStart = vertex
+            runEnd = vertex
+    if runStart is not None:
+        EncodeVarint(runEnd - runStart, runsPayload)
+
+    header = bytearray()
+    span = sortedClosure[-1] - sortedClosure[0] + 1 if count > 0 else 0
+    bitmapSize = (span + 7) // 8 + 10
+    if bitmapSize < len(deltaPayload) and bitmapSize < len(runsPayload):
+        header.append(closureEncodingBitmap)
+        EncodeVarint(count, header)
+        base = sortedClosure[0]
+        EncodeVarint(base, header)
+        EncodeVarint(span, header)
+        bitmap = bitarray(span, endian='little')
+        bitmap.setall(False)
+        for vertex in sortedClosure:
+            bitmap[vertex - base] = True
+        return bytes(header) + bitmap.tobytes()
+    elif len(runsPayload) < len(deltaPayload):
+        header.append(closureEncodingRuns)
+        EncodeVarint(count, header)
+        return bytes(header + runsPayload)
+    else:
+        header.append(closureEncodingDelta)
+        EncodeVarint(count, header)
+        return bytes(header + deltaPayload)
+
+
+def DecodeClosure(data):
+    encoding = data[0]
+    (count, position) = DecodeVarint(data, 1)
+    closure = []
+    if encoding == closureEncodingDelta:
+        vertex = 0
+        for _ in range(0, count):
+            (delta, position) = DecodeVarint(data, position)
+            vertex += delta
+            closure.append(vertex)
+    elif encoding == closureEncodingRuns:
+        nextVertex = 0
+        while len(closure) < count:
+            (gap, position) = DecodeVarint(data, position)
+            (runLength, position) = DecodeVarint(data, position)
+            runStart = nextVertex + gap
+            closure.extend(range(runStart, runStart + runLength + 1))
+            nextVertex = runStart + runLength + 1
+    elif encoding == closureEncodingBitmap:
+        (base, position) = DecodeVarint(data, position)
+        (span, position) = DecodeVarint(data, position)
+        bitmap = bitarray(endian='little')
+        bitmap.frombytes(bytes(data[position:]))
+        closure = [base + i for i in range(0, span) if bitmap[i]]
+    else:
+        raise ValueError("Unknown closure encoding %d!" % encoding)
+    return closure
+
+
+def WriteClosurePairsIndex(pairsFile, pairsIndex):
+    indexOffset = pairsFile.tell()
+    pickle.dump(pairsIndex, pairsFile, protocol=pickle.HIGHEST_PROTOCOL)
+    pairsFile.write(struct.pack('<Q', indexOffset))
+
+
+def ReadClosurePairsIndex(pairsFilename):
+    with open(pairsFilename, 'rb') as pairsFile:
+        if pairsFile.read(len(closurePairsMagic)) != closurePairsMagic:
+            raise ValueError("%s is not a closure pairs file!" % pairsFilename)
+        pairsFile.seek(-8, os.SEEK_END)
+        (indexOffset,) = struct.unpack('<Q', pairsFile.read(8))
+        pairsFile.seek(indexOffset)
+        return pickle.load(pairsFile)
+
+
+def ReadSourceClosure(pairsFilename, sourceVertex, pairsIndex=None):
+    # Pass the index returned by ReadClosurePairsIndex when looking up many sources, so it is only read once.
+    if pairsIndex is None:
+        pairsIndex = ReadClosurePairsIndex(pairsFilename)
+    location = pairsIndex.get(sourceVertex, None)
+    if location is None:
+        return None
+    (offset, length) = location
+    with open(pairsFilename, 'rb') as pairsFile:
+        pairsFile.seek(offset)
+        return DecodeClosure(pairsFile.read(length))
+
+
+def IterateClosurePairs(pairsFilename):
+    # Yields every (source, reached) pair, ordered by source vertex.
+    pairsIndex = ReadClosurePairsIndex(pairsFilename)
+    with open(pairsFilename, 'rb') as pairsFile:
+        for sourceVertex in sorted(pairsIndex):
+            (offset, length) = pairsIndex[sourceVertex]
+            pairsFile.seek(offset)
+            for reachedVertex in DecodeClosure(pairsFile.read(length)):
+                yield sourceVertex, reachedVertex
+
+
 def Main():
     args = ParseArgs()
     if args.command == 'compute':
         print("Computing the SSC.")
-        outputFilename = GetValidOutputFilename(args.outputfile, args.overwrite, args.unique)
+        if args.resume and args.checkpoint is None:
+            print("--resume requires a --checkpoint file.")
+            exit(1)
+        checkpoint = None
+        if args.resume and os.path.isfile(args.checkpoint):
+            checkpoint = ReadCheckpoint(args.checkpoint)
+        elif args.resume:
+            print("No checkpoint found, starting from the beginning.")
+        pairsFilename = None
+        if checkpoint is not None:
+            # The interrupted run already chose its output files (possibly unique names), and the pairs written before
+            # the checkpoint are kept, so the same files are reused instead of checking whether they exist.
+            if 'outputFilename' not in checkpoint or (checkpoint['pairsFilename'] is None) != (args.pairs is None):
+                print("Checkpoint '%s' belongs to a different output or pairs setting, cannot resume!" %
+                      args.checkpoint)
+                exit(1)
+            outputFilename = checkpoint['outputFilename']
+            pairsFilename = checkpoint['pairsFilename']
+            if pairsFilename is not None and not os.path.isfile(pairsFilename):
+                print("Cannot resume, the pairs file '%s' of the checkpoint is missing!" % pairsFilename)
+                exit(1)
+        else:
+            outputFilename = GetValidOutputFilename(args.outputfile, args.overwrite, args.unique)
+            if args.pairs is not None:
+                pairsFilename = GetValidOutputFilename(args.pairs, args.overwrite, args.unique)
         if args.compute_subcommand == 'fresh':
-            print("Performing a fresh computation from a text graph input file.")
+            print("Performing a fresh computation from a graph input file.")
             inputFilename = args.inputfile
-            (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber) = ParseInputfile(args.inputfile)
+            cacheDirectory = None if args.no_cache else args.cache_directory
+            (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds) = PreprocessInputfile(
+                args.inputfile, args.format, args.order, cacheDirectory, args.cache_size)
+            calibration = None
+            inputFiles = [args.inputfile]
         elif args.compute_subcommand == 'preprocessed':
             print("Performing a computation on a preprocessed graph input file.")
             inputFilename = args.graphfile_input
-            (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber) = ReadPreprocessedGraphFromFile(args.graphfile_input, args.sourcevertices_input)
+            (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds, calibration) = ReadPreprocessedGraphFromFile(args.graphfile_input, args.sourcevertices_input)
+            inputFiles = [args.graphfile_input, args.sourcevertices_input]
         else:
             print("Error parsing the compute subcommand from the arguments.")
             exit(1)
-        # Call SSC12 algorithm:
+        (alpha, beta) = (defaultAlpha, defaultBeta) if calibration is None else calibration
+        if calibration is not None and args.alpha is None and args.beta is None:
+            print("Using the calibrated thresholds from the preprocessed graph.")
+        alpha = alpha if args.alpha is None else args.alpha
+        beta = beta if args.beta is None else args.beta
+        inputFingerprint = None
+        if args.checkpoint is not None:
+            inputFingerprint = tuple(HashFile(filename) for filename in inputFiles)
+        threadCount = 1
+        if args.algorithm == 'SSC12':
+            # Decided here rather than in Closure, so that the marker line reports the workers that actually run.
+            jobCount = len(sourceVertices) - (0 if checkpoint is None else checkpoint['completed'].count())
+            workerLimits = GetWorkerLimits(args.executor, jobCount, args.memory_budget, maxVertexNumber)
+            threadCount = workerLimits[0]
+        # Same marker line as MassifParser.py looks for in the massif output.
+        print("Output for algorithm %d on dataset %s with %d threads" %
+              (algorithmNames.index(args.algorithm), inputFilename, threadCount))
         startTime = timer()
-        computedClosure = Closure(sourceVertices, adjacentLookup, args.alpha, args.beta, vertexCount, maxVertexNumber)
+        if args.algorithm == 'SSC12':
+            # Call SSC12 algorithm:
+            computedClosure = Closure(sourceVertices, adjacentLookup, alpha, beta, vertexCount, maxVertexNumber,
+                                      pairsFilename, vertexIds, args.executor, workerLimits,
+                                      args.spill_directory, args.checkpoint, args.checkpoint_interval, checkpoint,
+                                      inputFingerprint, outputFilename)
+        else:
+            if args.checkpoint is not None or args.memory_budget is not None or args.executor != 'process':
+                print("The executor, memory budget and checkpoint options only apply to SSC12, ignoring them.")
+            computedClosure = RelationClosure(args.algorithm, sourceVertices, adjacentLookup, pairsFilename,
+                                              vertexIds)
         endTime = timer()
-        WriteSSCOutputToFile(computedClosure, outputFilename, inputFilename, endTime - startTime)
+        computedClosure = TranslateVertexIds(computedClosure, vertexIds)
+        WriteSSCOutputToFile(computedClosure, outputFilename, inputFilename, endTime - startTime, args.algorithm,
+                             args.algorithm == 'SSC12' and args.executor == 'process')
+        if pairsFilename is not None:
+            print("Closure pairs written to %s (%d bytes)." % (pairsFilename, os.path.getsize(pairsFilename)))
+        if args.algorithm == 'SSC12' and args.checkpoint is not None and os.path.isfile(args.checkpoint):
+            # The output is complete, so the checkpoint is no longer needed.
+            os.remove(args.checkpoint)
     elif args.command == 'preprocess':
-        print("Only preprocessing the graph from a text graph input file.")
+        print("Only preprocessing the graph from a graph input file.")
         graphfile_output = GetValidOutputFilename(args.graphfile_output, args.overwrite, args.unique)
         sourcevertices_output = GetValidOutputFilename(args.sourcevertices_output, args.overwrite, args.unique)
-        (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber) = ParseInputfile(args.inputfile)
-        WritePreprocessedGraphToFile(adjacentLookup, sourceVertices, vertexCount, maxVertexNumber,
+        (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber) = ParseInputfile(args.inputfile, args.format)
+        (adjacentLookup, sourceVertices, maxVertexNumber, vertexIds) = CompactVertexIds(adjacentLookup, sourceVertices,
+                                                                                        args.order)
+        WritePreprocessedGraphToFile(adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds,
                                      graphfile_output, sourcevertices_output, args.overwrite, args.nrofvertexfiles)
+    elif args.command == 'calibrate':
+        print("Calibrating alpha and beta on a preprocessed graph.")
+        (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds, calibration) = ReadPreprocessedGraphFromFile(args.graphfile, args.sourcevertices)
+        if args.samples < 1:
+            print("The number of samples must be at least 1!")
+            exit(1)
+        calibration = Calibrate(adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, args.samples, args.seed)
+        WritePreprocessedGraph(adjacentLookup, vertexCount, maxVertexNumber, vertexIds, calibration, args.graphfile)
+        print("Saved the calibrated thresholds to %s." % args.graphfile)
+    elif args.command == 'benchmark':
+        (adjacentLookup, sourceVertices, vertexCount, maxVertexNumber, vertexIds, calibration) = ReadPreprocessedGraphFromFile(args.graphfile, args.sourcevertices)
+        (alpha, beta) = (defaultAlpha, defaultBeta) if calibration is None else calibration
+        Benchmark(adjacentLookup, sourceVertices, vertexCount, alpha, beta, args.samples, args.seed)
+    elif args.command == 'lookup':
+        try:
+            closure = ReadSourceClosure(args.pairsfile, args.sourcevertex)
+        except (ValueError, EOFError, struct.error, pickle.UnpicklingError):
+            print("Pairs file '%s' is corrupt or in the wrong format!" % args.pairsfile)
+            exit(1)
+        if closure is None:
+            print("Vertex %d is not a source vertex in '%s'." % (args.sourcevertex, args.pairsfile))
+            exit(1)
+        print('"Source"\t"Vertex"')
+        for vertex in closure:
+            print("%d\t%d" % (args.sourcevertex, vertex))
+        return
     else:
         print("Error parsing the command from the arguments.")
         exit(1)